@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the related-pages similarity index.
+Builds the index from a synthetic corpus of Confluence storage bodies and
+times the build, batched top-k queries and incremental updates.
+"""
+
+import argparse
+import random
+import time
+from itertools import accumulate
+
+from confluence_client.similarity import RelatedPagesIndex
+
+def make_vocabulary(size, rng):
+    """Generate pseudo-words for the synthetic corpus."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def make_page(vocabulary, cum_weights, rng, length):
+    """Generate a storage format body with a Zipf-like word distribution."""
+    words = rng.choices(vocabulary, cum_weights=cum_weights, k=length)
+    paragraphs = [" ".join(words[i:i + 50]) for i in range(0, len(words), 50)]
+    return "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+
+def timed(label, func):
+    """Run a function and print how long it took."""
+    start = time.perf_counter()
+    result = func()
+    print(f"{label}: {time.perf_counter() - start:.2f}s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the related-pages similarity index')
+    parser.add_argument('--pages', type=int, default=100000, help='Number of synthetic pages')
+    parser.add_argument('--words', type=int, default=300, help='Average words per page')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='Vocabulary size')
+    parser.add_argument('--queries', type=int, default=1000, help='Number of batched queries')
+    parser.add_argument('--updates', type=int, default=1000, help='Number of incremental updates')
+    parser.add_argument('--k', type=int, default=10, help='Related pages per query')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    def page_length():
+        return max(10, int(rng.gauss(args.words, args.words / 3)))
+
+    corpus = timed(
+        f"Generate {args.pages} pages",
+        lambda: [make_page(vocabulary, cum_weights, rng, page_length()) for _ in range(args.pages)]
+    )
+
+    index = RelatedPagesIndex()
+
+    def build():
+        for page_id, storage in enumerate(corpus):
+            index.add_page(page_id, storage, title=f"Page {page_id}")
+
+    timed("Convert and vectorize pages", build)
+    timed("Build TF-IDF matrix", lambda: index.find_related(page_id=0, k=args.k))
+
+    query_ids = rng.sample(range(args.pages), min(args.queries, args.pages))
+    queries = [corpus[page_id] for page_id in query_ids]
+    timed(f"{len(queries)} batched text queries (k={args.k})",
+          lambda: index.find_related_batch(queries, k=args.k))
+    timed(f"{len(query_ids)} single page queries (k={args.k})",
+          lambda: [index.find_related(page_id=page_id, k=args.k) for page_id in query_ids])
+
+    def update():
+        for page_id in rng.sample(range(args.pages), min(args.updates, args.pages)):
+            index.add_page(page_id, make_page(vocabulary, cum_weights, rng, page_length()), title=f"Page {page_id}")
+
+    timed(f"Apply {args.updates} incremental updates", update)
+    timed("First query after updates", lambda: index.find_related(page_id=0, k=args.k))
+
+    def interleaved():
+        for page_id in rng.sample(range(args.pages), min(args.updates, args.pages)):
+            index.add_page(page_id, make_page(vocabulary, cum_weights, rng, page_length()), title=f"Page {page_id}")
+            index.find_related(page_id=page_id, k=args.k)
+
+    timed(f"{args.updates} interleaved updates and queries", interleaved)
+
+if __name__ == "__main__":
+    main()
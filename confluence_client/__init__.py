@@ -1,2 +1,6 @@
 from .client import ConfluenceClient
 from .content import ManageContent
+from .budget import ResponseBudget
+from .cache import ContentCache
+from .prefetch import Prefetcher
+from .tracing import tracer, profiler
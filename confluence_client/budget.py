@@ -0,0 +1,195 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+import pydantic_core
+
+logger = logging.getLogger("confluence_mcp")
+
+# Response budget settings. A budget or entry limit of 0 disables that limit.
+RESPONSE_MAX_BYTES = int(os.environ.get("CONFLUENCE_RESPONSE_MAX_BYTES", "60000"))
+RESPONSE_MAX_TOKENS = int(os.environ.get("CONFLUENCE_RESPONSE_MAX_TOKENS", "0"))
+CONTINUATION_TTL_SECONDS = int(os.environ.get("CONFLUENCE_CONTINUATION_TTL_SECONDS", "300"))
+CONTINUATION_MAX_ENTRIES = int(os.environ.get("CONFLUENCE_CONTINUATION_MAX_ENTRIES", "64"))
+
+# Rough bytes-per-token ratio used to turn a token budget into a byte budget
+BYTES_PER_TOKEN = 4
+
+# Placeholder handle used to size envelopes before the real handle exists
+HANDLE_PLACEHOLDER = "0" * 32
+
+
+class ResponseBudget:
+    """Keep tool results within a byte/token budget.
+
+    Results that fit are returned untouched. Oversized results are split into
+    deterministic chunks; the first chunk is returned together with a
+    continuation handle and the remaining chunks are kept in a short-lived
+    in-memory buffer so they can be fetched without querying Confluence again.
+
+    Sizes are measured as FastMCP sends them: indented JSON text, with list
+    items sent as separate text contents. Chunks are sized so that the whole
+    envelope, including the escaped string of a JSON text chunk, fits.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_MAX_BYTES, max_tokens=RESPONSE_MAX_TOKENS,
+                 ttl_seconds=CONTINUATION_TTL_SECONDS, max_entries=CONTINUATION_MAX_ENTRIES):
+        limits = [limit for limit in (max_bytes, max_tokens * BYTES_PER_TOKEN) if limit > 0]
+        self.max_bytes = min(limits) if limits else 0
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._buffer = OrderedDict()
+        self._lock = threading.Lock()
+
+    def apply(self, result):
+        """Return the result, or its first chunk plus a continuation handle if it is too large."""
+        if not self.max_bytes:
+            return result
+
+        total_bytes = self._sent_size(result)
+        if total_bytes <= self.max_bytes:
+            return result
+
+        chunks = self._chunk_list(result, total_bytes) if isinstance(result, list) else None
+        if chunks is not None:
+            kind = "items"
+        else:
+            # Dicts, and lists with an item too large to fit on its own, are cut as JSON text
+            chunks = self._chunk_text(self._serialize(result).decode("utf-8"), total_bytes)
+            kind = "json_text"
+
+        logger.info(f"Response of {total_bytes} bytes exceeds budget of {self.max_bytes} bytes, "
+                    f"split into {len(chunks)} chunks")
+
+        handle = self._store(chunks, kind, total_bytes) if len(chunks) > 1 else None
+        return self._envelope(chunks[0], kind, 0, len(chunks), total_bytes, handle)
+
+    def get_continuation(self, handle):
+        """Return the next chunk for a continuation handle."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._buffer.get(handle)
+            if entry is None:
+                return {"error": f"Unknown or expired continuation handle: {handle}"}
+
+            index = entry["next"]
+            entry["next"] += 1
+            if entry["next"] >= len(entry["chunks"]):
+                del self._buffer[handle]
+                next_handle = None
+            else:
+                entry["expires_at"] = time.monotonic() + self.ttl_seconds
+                next_handle = handle
+
+        return self._envelope(entry["chunks"][index], entry["kind"], index,
+                              len(entry["chunks"]), entry["total_bytes"], next_handle)
+
+    def _store(self, chunks, kind, total_bytes):
+        """Buffer the chunks of an oversized result and return a new handle."""
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._evict_expired()
+            while self.max_entries > 0 and self._buffer and len(self._buffer) >= self.max_entries:
+                self._buffer.popitem(last=False)
+            self._buffer[handle] = {
+                "chunks": chunks,
+                "kind": kind,
+                "total_bytes": total_bytes,
+                "next": 1,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+        return handle
+
+    def _evict_expired(self):
+        """Drop buffered results whose TTL has elapsed. Caller must hold the lock."""
+        now = time.monotonic()
+        expired = [handle for handle, entry in self._buffer.items() if entry["expires_at"] <= now]
+        for handle in expired:
+            del self._buffer[handle]
+
+    def _chunk_list(self, items, total_bytes):
+        """Split a list into consecutive runs of items whose envelopes each fit the budget.
+
+        Returns None if a single item does not fit the budget on its own.
+        """
+        budget = self.max_bytes - self._envelope_overhead([], "items", total_bytes)
+        empty_size = len(self._serialize({"result": []}))
+        chunks = []
+        current = []
+        current_size = 0
+
+        for item in items:
+            # Size of the item as nested in the envelope, including its line breaks,
+            # indentation and separator; slightly over for every item after the first
+            item_size = len(self._serialize({"result": [item]})) - empty_size
+            if item_size > budget:
+                return None
+            if current and current_size + item_size > budget:
+                chunks.append(current)
+                current = []
+                current_size = 0
+            current.append(item)
+            current_size += item_size
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _chunk_text(self, text, total_bytes):
+        """Split JSON text into pieces whose escaped envelopes each fit the budget."""
+        budget = self.max_bytes - self._envelope_overhead("", "json_text", total_bytes)
+        chunks = []
+        start = 0
+        while start < len(text):
+            # Every character costs at least one byte once escaped, so the piece is
+            # at most budget characters long; shrink it until its escaped form fits
+            low, high = start + 1, min(start + max(budget, 1), len(text))
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self._escaped_size(text[start:middle]) <= budget:
+                    low = middle
+                else:
+                    high = middle - 1
+            chunks.append(text[start:low])
+            start = low
+        return chunks
+
+    def _envelope_overhead(self, empty_chunk, kind, total_bytes):
+        """Size of an envelope around an empty chunk, with counters at their widest."""
+        envelope = self._envelope(empty_chunk, kind, total_bytes, total_bytes, total_bytes, HANDLE_PLACEHOLDER)
+        envelope["truncated"] = False
+        return len(self._serialize(envelope))
+
+    def _escaped_size(self, text):
+        """Size of a string once JSON-escaped, without its quotes."""
+        return len(self._serialize(text)) - 2
+
+    def _envelope(self, chunk, kind, index, total_chunks, total_bytes, handle):
+        """Wrap a chunk with the metadata a client needs to fetch the rest."""
+        return {
+            "result": chunk,
+            "truncated": handle is not None,
+            "continuation": handle,
+            "chunk_kind": kind,
+            "chunk": index + 1,
+            "total_chunks": total_chunks,
+            "total_bytes": total_bytes,
+        }
+
+    def _sent_size(self, result):
+        """Size of a tool result as FastMCP sends it."""
+        if result is None:
+            return 0
+        if isinstance(result, (list, tuple)):
+            # Each list item is sent as its own text content
+            return sum(self._sent_size(item) for item in result)
+        if isinstance(result, str):
+            return len(result.encode("utf-8"))
+        return len(self._serialize(result))
+
+    def _serialize(self, obj):
+        """Serialize an object the way FastMCP does when it returns a tool result."""
+        return pydantic_core.to_json(obj, fallback=str, indent=2)
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import zlib
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger("confluence_mcp")
+
+# In-memory cache settings. A TTL of 0 disables caching.
+CACHE_TTL_SECONDS = int(os.environ.get("CONFLUENCE_CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CONFLUENCE_CACHE_MAX_ENTRIES", "5000"))
+
+# On-disk snapshot settings. An empty path disables the snapshot.
+CACHE_SNAPSHOT_PATH = os.environ.get("CONFLUENCE_CACHE_SNAPSHOT_PATH", "")
+CACHE_SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("CONFLUENCE_CACHE_SNAPSHOT_INTERVAL_SECONDS", "60"))
+CACHE_SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get("CONFLUENCE_CACHE_SNAPSHOT_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+CACHE_NAMESPACES = ("page", "space", "tree", "search")
+
+
+class CacheEntry:
+    """A cached value with the page version it was fetched at, if any."""
+
+    __slots__ = ("value", "version", "stored_at", "restored", "prefetched")
+
+    def __init__(self, value, version=None, stored_at=None, restored=False, prefetched=False):
+        self.value = value
+        self.version = version
+        self.stored_at = time.time() if stored_at is None else stored_at
+        self.restored = restored
+        self.prefetched = prefetched
+
+
+class CacheSnapshot:
+    """SQLite-backed snapshot of cache entries with zlib-compressed bodies.
+
+    Entries are read one key at a time on a cache miss, so opening a large
+    snapshot at startup costs no more than opening the database file.
+    """
+
+    def __init__(self, path, max_age_seconds=CACHE_SNAPSHOT_MAX_AGE_SECONDS):
+        self.path = os.path.expanduser(path)
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, version INTEGER, "
+            "stored_at REAL NOT NULL, body BLOB NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._db.commit()
+
+    def load(self, namespace, key):
+        """Return the snapshot entry for a key, or None if it is not stored."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, stored_at, body FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        version, stored_at, body = row
+        value = json.loads(zlib.decompress(body).decode("utf-8"))
+        return CacheEntry(value, version=version, stored_at=stored_at, restored=True)
+
+    def write(self, entries, deleted):
+        """Upsert changed entries, drop deleted keys and prune expired rows."""
+        rows = [
+            (namespace, key, entry.version, entry.stored_at,
+             zlib.compress(json.dumps(entry.value, separators=(",", ":"), default=str).encode("utf-8")))
+            for (namespace, key), entry in entries
+        ]
+        with self._lock:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+                self._db.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", deleted)
+                self._db.execute("DELETE FROM entries WHERE stored_at < ?",
+                                 (time.time() - self.max_age_seconds,))
+
+    def delete_namespace(self, namespace):
+        """Drop every stored entry in a namespace."""
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def close(self):
+        """Close the snapshot database."""
+        with self._lock:
+            self._db.close()
+
+
+class ContentCache:
+    """In-memory LRU cache for page, space, tree and search results.
+
+    Entries expire after a TTL. Entries that carry a page version are not
+    discarded when they go stale or are restored from the snapshot; instead
+    they are revalidated against the current version on first access, which
+    costs one small request instead of refetching the full body.
+    """
+
+    def __init__(self, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES,
+                 snapshot_path=CACHE_SNAPSHOT_PATH, snapshot_interval=CACHE_SNAPSHOT_INTERVAL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._dirty = {}
+        self._deleted = set()
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._local = threading.local()
+        self._stats = {namespace: {"hits": 0, "misses": 0} for namespace in CACHE_NAMESPACES}
+        self._prefetched = 0
+        self._prefetch_hits = 0
+
+        if snapshot_path and self.enabled:
+            try:
+                self._snapshot = CacheSnapshot(snapshot_path)
+                logger.info(f"Using cache snapshot at {snapshot_path}")
+            except Exception as e:
+                logger.error(f"Failed to open cache snapshot {snapshot_path}: {str(e)}")
+            else:
+                if snapshot_interval > 0:
+                    threading.Thread(target=self._flush_periodically, args=(snapshot_interval,),
+                                     name="cache-snapshot", daemon=True).start()
+                atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0
+
+    @property
+    def is_prefetching(self):
+        """True while the current thread is running a prefetch."""
+        return getattr(self._local, "prefetching", False)
+
+    @contextmanager
+    def prefetching(self):
+        """Mark cache traffic on the current thread as prefetch traffic.
+
+        Lookups made while prefetching are left out of the hit-rate stats, and
+        entries stored while prefetching are tracked so later hits on them can
+        be credited to the prefetcher.
+        """
+        self._local.prefetching = True
+        try:
+            yield
+        finally:
+            self._local.prefetching = False
+
+    def get(self, namespace, key, revalidate=None):
+        """Return a cached value, or None on a miss.
+
+        Args:
+            namespace: One of CACHE_NAMESPACES
+            key: Cache key within the namespace
+            revalidate: Optional callable taking the cached version and returning
+                        True if it is still current
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._lookup(namespace, key, revalidate)
+        if not self.is_prefetching:
+            with self._lock:
+                self._stats[namespace]["hits" if entry is not None else "misses"] += 1
+                if entry is not None and entry.prefetched:
+                    entry.prefetched = False
+                    self._prefetch_hits += 1
+        return entry.value if entry is not None else None
+
+    def contains(self, namespace, key):
+        """Return True if a fresh entry is held in memory, without counting a lookup."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+        return entry is not None and not entry.restored and time.time() - entry.stored_at < self.ttl_seconds
+
+    def stats(self):
+        """Return hit/miss counts per namespace and prefetch effectiveness."""
+        with self._lock:
+            namespaces = {}
+            for namespace, counts in self._stats.items():
+                lookups = counts["hits"] + counts["misses"]
+                hit_rate = round(counts["hits"] / lookups, 3) if lookups else None
+                namespaces[namespace] = dict(counts, hit_rate=hit_rate)
+            return {
+                "entries": len(self._entries),
+                "namespaces": namespaces,
+                "prefetched_entries": self._prefetched,
+                "prefetch_hits": self._prefetch_hits,
+                "prefetch_hit_rate": round(self._prefetch_hits / self._prefetched, 3) if self._prefetched else None,
+            }
+
+    def _lookup(self, namespace, key, revalidate):
+        """Find a fresh or successfully revalidated entry, dropping it if it is out of date."""
+        cache_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+
+        if entry is None and self._snapshot is not None:
+            entry = self._load_from_snapshot(cache_key)
+        if entry is None:
+            return None
+
+        if not entry.restored and time.time() - entry.stored_at < self.ttl_seconds:
+            return entry
+
+        if entry.version is not None and revalidate is not None:
+            try:
+                current = revalidate(entry.version)
+            except Exception as e:
+                logger.warning(f"Failed to revalidate cached {namespace} {key}: {str(e)}")
+                current = False
+            if current:
+                entry = CacheEntry(entry.value, version=entry.version, prefetched=entry.prefetched)
+                self._put(cache_key, entry)
+                return entry
+        elif entry.restored and time.time() - entry.stored_at < self.ttl_seconds:
+            entry = CacheEntry(entry.value, stored_at=entry.stored_at)
+            self._put(cache_key, entry)
+            return entry
+
+        self.invalidate(namespace, key)
+        return None
+
+    def set(self, namespace, key, value, version=None):
+        """Store a value, optionally tagged with the page version it was fetched at."""
+        if self.enabled:
+            prefetched = self.is_prefetching
+            self._put((namespace, key), CacheEntry(value, version=version, prefetched=prefetched))
+            if prefetched:
+                with self._lock:
+                    self._prefetched += 1
+
+    def invalidate(self, namespace, key):
+        """Drop a single cached entry."""
+        cache_key = (namespace, key)
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._dirty.pop(cache_key, None)
+            if self._snapshot is not None:
+                self._deleted.add(cache_key)
+
+    def invalidate_namespace(self, namespace):
+        """Drop every cached entry in a namespace."""
+        with self._lock:
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == namespace]:
+                del self._entries[cache_key]
+            for cache_key in [cache_key for cache_key in self._dirty if cache_key[0] == namespace]:
+                del self._dirty[cache_key]
+        if self._snapshot is not None:
+            self._snapshot.delete_namespace(namespace)
+
+    def flush(self):
+        """Write changed entries to the snapshot."""
+        if self._snapshot is None:
+            return
+        with self._lock:
+            entries = list(self._dirty.items())
+            deleted = list(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+        if entries or deleted:
+            try:
+                self._snapshot.write(entries, deleted)
+                logger.info(f"Wrote {len(entries)} cache entries to snapshot")
+            except Exception as e:
+                logger.error(f"Failed to write cache snapshot: {str(e)}")
+
+    def close(self):
+        """Flush and close the snapshot."""
+        self._stop.set()
+        if self._snapshot is not None:
+            self.flush()
+            self._snapshot.close()
+            self._snapshot = None
+
+    def _put(self, cache_key, entry):
+        """Store an entry, evicting the least recently used entries over the limit."""
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            if self._snapshot is not None:
+                self._dirty[cache_key] = entry
+                self._deleted.discard(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load_from_snapshot(self, cache_key):
+        """Read a single entry from the snapshot on a memory miss."""
+        try:
+            return self._snapshot.load(*cache_key)
+        except Exception as e:
+            logger.warning(f"Failed to read cache snapshot entry {cache_key}: {str(e)}")
+            return None
+
+    def _flush_periodically(self, interval):
+        """Background loop that writes the snapshot every interval seconds."""
+        while not self._stop.wait(interval):
+            self.flush()
@@ -1,6 +1,13 @@
+import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from .client import Confluence, ConfluenceError
+from .similarity import RelatedPagesIndex
+from .links import LinkGraph
+from .cache import ContentCache
+from .prefetch import Prefetcher, PREFETCH_ENABLED, PREFETCH_SEARCH_HITS
+from .tracing import TracedClient, trace_methods, tracer
 
 logger = logging.getLogger("confluence_mcp")
 
@@ -13,18 +20,37 @@ CONTENT_REPRESENTATIONS = {
     "styled_view": "styled_view"
 }
 
+# Page fields that describe the page tree rather than the page content
+PAGE_TREE_FIELDS = ('ancestors', 'descendants')
+
+# Concurrent upstream requests used to fetch one level of a page tree
+DESCENDANT_FETCH_WORKERS = int(os.environ.get("CONFLUENCE_DESCENDANT_FETCH_WORKERS", "8"))
+
+@trace_methods("_remove_null_values", "_get_filtered_pages", "_get_filtered_content", "_index_page")
 class ManageContent:
     """Class for managing Confluence content."""
 
-    def __init__(self, confluence_client: Confluence):
-        self.confluence = confluence_client
+    def __init__(self, confluence_client: Confluence, cache: ContentCache = None, prefetcher: Prefetcher = None):
+        self.cache = cache if cache is not None else ContentCache()
+        if prefetcher is None and PREFETCH_ENABLED and self.cache.enabled:
+            prefetcher = Prefetcher(self.cache)
+        self.prefetcher = prefetcher
+        # Upstream requests made by prefetch tasks are charged to the prefetch budget
+        self.confluence = TracedClient(confluence_client,
+                                       before_call=prefetcher.charge if prefetcher is not None else None)
+        self.related_pages = RelatedPagesIndex()
+        self.link_graph = LinkGraph()
 
     def GetSpaces(self, limit=50):
         """Get all Confluence spaces."""
         try:
+            cached = self.cache.get("space", f"all:{limit}")
+            if cached is not None:
+                return cached
             logger.info(f"Fetching up to {limit} Confluence spaces")
             spaces = self.confluence.get_all_spaces(start=0, limit=limit)
             logger.info(f"Successfully retrieved {len(spaces.get('results', []))} spaces")
+            self.cache.set("space", f"all:{limit}", spaces)
             # Return the Python object directly instead of JSON string
             return spaces
         except Exception as e:
@@ -38,8 +64,12 @@ class ManageContent:
 
     def GetSpace(self, space_key):
         """Get a specific Confluence space by key."""
-        space = self.confluence.get_space(space_key)
-        return self._remove_null_values(space)
+        cached = self.cache.get("space", space_key)
+        if cached is not None:
+            return cached
+        space = self._remove_null_values(self.confluence.get_space(space_key))
+        self.cache.set("space", space_key, space)
+        return space
 
     def GetPagesInSpace(self, space_key, limit=20):
         """Get pages in a specific Confluence space."""
@@ -62,39 +92,137 @@ class ManageContent:
     def GetPage(self, page_id):
         """Get a specific Confluence page by ID."""
         try:
+            page_id = str(page_id)
+            cached = self.cache.get(
+                "page", page_id, revalidate=lambda version: self._revalidate_page(page_id, version)
+            )
+            if cached is not None:
+                logger.info(f"Serving page {page_id} from cache")
+                if page_id not in self.related_pages or page_id not in self.link_graph:
+                    self._index_page(cached)
+                self._prefetch_page_context(page_id)
+                return dict(cached, **self._get_page_tree_fields(page_id))
+
             logger.info(f"Fetching Confluence page with ID: {page_id}")
             page = self.confluence.get_page_by_id(page_id, expand='body.storage,version,space,ancestors,descendants.page')
             if not page:
                 logger.warning(f"No page found with ID: {page_id}")
                 return {"error": f"No page found with ID: {page_id}"}
             logger.info(f"Successfully retrieved page: {page.get('title', 'Untitled')}")
-            return self._remove_null_values(page)
+            self._index_page(page)
+            result = self._remove_null_values(page)
+            # Tree fields change without bumping the page version, so they are cached
+            # separately on the plain TTL rather than with the version-checked page
+            content = {k: v for k, v in result.items() if k not in PAGE_TREE_FIELDS}
+            self.cache.set("page", page_id, content, version=page.get('version', {}).get('number'))
+            self._cache_page_tree_fields(page_id, result)
+            self._prefetch_page_context(page_id)
+            return result
         except Exception as e:
             logger.error(f"Error fetching page with ID {page_id}: {str(e)}")
             raise ConfluenceError(f"Error fetching page with ID {page_id}: {str(e)}")
 
+    def _get_page_tree_fields(self, page_id):
+        """Get the ancestors and descendants of a page, cached on the plain TTL."""
+        cached = self.cache.get("tree", f"page:{page_id}")
+        if cached is not None:
+            return cached
+        page = self.confluence.get_page_by_id(page_id, expand='ancestors,descendants.page') or {}
+        return self._cache_page_tree_fields(page_id, page)
+
+    def _cache_page_tree_fields(self, page_id, page):
+        """Store the ancestors and descendants of a fetched page in the tree namespace."""
+        tree = self._remove_null_values({k: v for k, v in page.items() if k in PAGE_TREE_FIELDS})
+        self.cache.set("tree", f"page:{page_id}", tree)
+        return tree
+
     def GetPageByTitle(self, space_key, title):
         """Get a specific Confluence page by title in a space."""
         page = self.confluence.get_page_by_title(space_key, title, expand='body.storage,version,space,ancestors')
         if page:
+            self._index_page(page)
             return self._remove_null_values(page)
         return None
 
     def GetChildPages(self, page_id):
         """Get child pages of a specific Confluence page."""
         try:
-            children = self.confluence.get_page_child_by_type(page_id)
-            return self._get_filtered_pages(children)
+            cached = self.cache.get("tree", f"children:{page_id}")
+            if cached is not None:
+                return cached
+            children = self._get_filtered_pages(self.confluence.get_page_child_by_type(page_id))
+            self.cache.set("tree", f"children:{page_id}", children)
+            return children
         except Exception as e:
             logger.error(f"Error getting child pages for {page_id}: {str(e)}")
             raise ConfluenceError(f"Error getting child pages for {page_id}: {str(e)}")
 
+    def GetDescendants(self, page_id, max_depth=5, max_nodes=1000):
+        """Get descendant pages of a Confluence page in breadth-first (level) order."""
+        cache_key = f"descendants:{page_id}:{max_depth}:{max_nodes}"
+        cached = self.cache.get("tree", cache_key)
+        if cached is not None:
+            return cached
+        descendants = []
+        for level in self.IterDescendants(page_id, max_depth, max_nodes):
+            descendants.extend(level)
+        self.cache.set("tree", cache_key, descendants)
+        return descendants
+
+    def IterDescendants(self, page_id, max_depth=5, max_nodes=1000):
+        """Walk the page tree breadth-first, yielding one level of descendants at a time.
+
+        The children of every page on a level are fetched concurrently, each with
+        full pagination, so a tree loads in roughly depth round trips rather than
+        one round trip per page.
+        """
+        try:
+            logger.info(f"Fetching descendants of page {page_id} (max_depth={max_depth}, max_nodes={max_nodes})")
+            seen = {str(page_id)}
+            level = [str(page_id)]
+            total = 0
+
+            with ThreadPoolExecutor(max_workers=DESCENDANT_FETCH_WORKERS) as executor:
+                for depth in range(1, max_depth + 1):
+                    if not level or total >= max_nodes:
+                        break
+
+                    next_level = []
+                    children_by_parent = executor.map(tracer.propagate(self._get_all_child_pages), level)
+                    for parent_id, children in zip(level, children_by_parent):
+                        for child in self._get_filtered_pages(children):
+                            if child['id'] in seen or total + len(next_level) >= max_nodes:
+                                continue
+                            seen.add(child['id'])
+                            child['parent_id'] = parent_id
+                            child['depth'] = depth
+                            next_level.append(child)
+
+                    total += len(next_level)
+                    logger.info(f"Fetched {len(next_level)} descendants at depth {depth}")
+                    if next_level:
+                        yield next_level
+                    level = [child['id'] for child in next_level]
+        except Exception as e:
+            logger.error(f"Error getting descendants for page {page_id}: {str(e)}")
+            raise ConfluenceError(f"Error getting descendants for page {page_id}: {str(e)}")
+
+    def _get_all_child_pages(self, page_id):
+        """Fetch every child page of a page, following the upstream `next` links."""
+        # Without start/limit the client pages through `_links.next` itself, so a
+        # server-side cap on the page size cannot cut the list short
+        return list(self.confluence.get_page_child_by_type(page_id, type='page') or [])
+
     def GetPageAncestors(self, page_id):
         """Get ancestors of a specific Confluence page."""
         try:
+            cached = self.cache.get("tree", f"ancestors:{page_id}")
+            if cached is not None:
+                return cached
             page = self.confluence.get_page_by_id(page_id, expand='ancestors')
-            ancestors = page.get('ancestors', []) if page else []
-            return self._get_filtered_pages(ancestors)
+            ancestors = self._get_filtered_pages(page.get('ancestors', []) if page else [])
+            self.cache.set("tree", f"ancestors:{page_id}", ancestors)
+            return ancestors
         except Exception as e:
             logger.error(f"Error getting ancestors for page {page_id}: {str(e)}")
             raise ConfluenceError(f"Error getting ancestors for page {page_id}: {str(e)}")
@@ -102,6 +230,11 @@ class ManageContent:
     def SearchContent(self, query, content_type="page", space_key=None, max_results=10):
         """Search for Confluence content matching a query."""
         try:
+            cache_key = json.dumps(["text", query, content_type, space_key, max_results])
+            cached = self.cache.get("search", cache_key)
+            if cached is not None:
+                return cached
+
             # Clean and escape the query for CQL
             cleaned_query = query.replace('"', '\\"').replace('\\', '\\\\').strip()
 
@@ -116,7 +249,10 @@ class ManageContent:
             result_count = len(results.get('results', []))
             logger.info(f"Search returned {result_count} results")
 
-            return self._get_filtered_content(results.get('results', []))
+            content = self._get_filtered_content(results.get('results', []))
+            self.cache.set("search", cache_key, content)
+            self._prefetch_search_hits(content)
+            return content
         except Exception as e:
             error_msg = f"Error searching content with query '{query}': {str(e)}"
             logger.error(error_msg)
@@ -125,7 +261,11 @@ class ManageContent:
     def GetPageLabels(self, page_id):
         """Get labels for a specific Confluence page."""
         try:
+            cached = self.cache.get("page", f"labels:{page_id}")
+            if cached is not None:
+                return cached
             labels = self.confluence.get_page_labels(page_id)
+            self.cache.set("page", f"labels:{page_id}", labels)
             return labels
         except Exception as e:
             logger.error(f"Error getting labels for page {page_id}: {str(e)}")
@@ -134,12 +274,19 @@ class ManageContent:
     def GetContentByLabel(self, label, space_key=None, content_type="page", max_results=10):
         """Find Confluence content with a specific label."""
         try:
+            cache_key = json.dumps(["label", label, space_key, content_type, max_results])
+            cached = self.cache.get("search", cache_key)
+            if cached is not None:
+                return cached
+
             cql = f'type={content_type} AND label="{label}"'
             if space_key:
                 cql += f' AND space="{space_key}"'
 
             results = self.confluence.cql(cql, limit=max_results)
-            return self._get_filtered_content(results.get('results', []))
+            content = self._get_filtered_content(results.get('results', []))
+            self.cache.set("search", cache_key, content)
+            return content
         except Exception as e:
             logger.error(f"Error getting content with label {label}: {str(e)}")
             raise ConfluenceError(f"Error getting content with label {label}: {str(e)}")
@@ -153,6 +300,127 @@ class ManageContent:
             logger.error(f"Error getting attachments for page {page_id}: {str(e)}")
             raise ConfluenceError(f"Error getting attachments for page {page_id}: {str(e)}")
 
+    def IndexSpaceForRelatedPages(self, space_key, max_pages=1000, batch_size=100):
+        """Add the pages of a space to the related-pages index and the link graph."""
+        try:
+            logger.info(f"Indexing up to {max_pages} pages from space {space_key} for related-page queries")
+            indexed = 0
+            start = 0
+            while indexed < max_pages:
+                limit = min(batch_size, max_pages - indexed)
+                pages = self.confluence.get_all_pages_from_space(
+                    space_key, start=start, limit=limit, expand='body.storage,space'
+                )
+                if not pages:
+                    break
+                for page in pages:
+                    self._index_page(page)
+                indexed += len(pages)
+                start += len(pages)
+                if len(pages) < limit:
+                    break
+            logger.info(f"Indexed {indexed} pages from space {space_key}")
+            return {"space": space_key, "indexed_pages": indexed, "total_indexed_pages": len(self.related_pages)}
+        except Exception as e:
+            logger.error(f"Error indexing pages for space {space_key}: {str(e)}")
+            raise ConfluenceError(f"Error indexing pages for space {space_key}: {str(e)}")
+
+    def FindRelatedPages(self, page_id=None, text=None, k=10):
+        """Find indexed pages similar to a page or to free text."""
+        if page_id is None and not text:
+            raise ConfluenceError("Either page_id or text is required to find related pages")
+        try:
+            if page_id is not None and page_id not in self.related_pages:
+                # Fetching the page adds it to the index
+                self.GetPage(page_id)
+                if page_id not in self.related_pages:
+                    raise ConfluenceError(f"Page {page_id} could not be added to the related-pages index")
+            if page_id is not None:
+                return self.related_pages.find_related(page_id=page_id, k=k)
+            return self.related_pages.find_related(text=text, k=k)
+        except ConfluenceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error finding related pages: {str(e)}")
+            raise ConfluenceError(f"Error finding related pages: {str(e)}")
+
+    def GetBacklinks(self, page_id):
+        """Get the indexed pages that link to a specific Confluence page."""
+        try:
+            self._ensure_linked(page_id)
+            return {
+                "page_id": str(page_id),
+                "backlinks": self.link_graph.backlinks(page_id),
+                "indexed_pages": len(self.link_graph)
+            }
+        except ConfluenceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting backlinks for page {page_id}: {str(e)}")
+            raise ConfluenceError(f"Error getting backlinks for page {page_id}: {str(e)}")
+
+    def GetOutgoingLinks(self, page_id):
+        """Get the pages a specific Confluence page links to."""
+        try:
+            self._ensure_linked(page_id)
+            return self.link_graph.outgoing_links(page_id)
+        except ConfluenceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting outgoing links for page {page_id}: {str(e)}")
+            raise ConfluenceError(f"Error getting outgoing links for page {page_id}: {str(e)}")
+
+    def GetOrphanPages(self, space_key=None):
+        """Get indexed pages that no other indexed page links to."""
+        return self.link_graph.orphans(space_key)
+
+    def _ensure_linked(self, page_id):
+        """Fetch a page into the link graph if it has not been indexed yet."""
+        if page_id not in self.link_graph:
+            # Fetching the page adds it to the link graph
+            self.GetPage(page_id)
+            if page_id not in self.link_graph:
+                raise ConfluenceError(f"Page {page_id} could not be added to the link graph")
+
+    def _prefetch_page_context(self, page_id):
+        """Warm the cache with the calls that usually follow fetching a page."""
+        if self.prefetcher is None:
+            return
+        self.prefetcher.submit(("tree", f"children:{page_id}"), self.GetChildPages, page_id)
+        self.prefetcher.submit(("tree", f"ancestors:{page_id}"), self.GetPageAncestors, page_id)
+        self.prefetcher.submit(("page", f"labels:{page_id}"), self.GetPageLabels, page_id)
+
+    def _prefetch_search_hits(self, content):
+        """Warm the cache with the top pages of a search result."""
+        if self.prefetcher is None:
+            return
+        for item in content[:PREFETCH_SEARCH_HITS]:
+            if item.get('type') == 'page' and item.get('id'):
+                self.prefetcher.submit(("page", str(item['id'])), self.GetPage, item['id'])
+
+    def _revalidate_page(self, page_id, version):
+        """Check a cached page against its current version without fetching its body.
+
+        The tree fields come back in the same request and refresh the tree entry,
+        so serving a revalidated page costs a single round trip.
+        """
+        page = self.confluence.get_page_by_id(page_id, expand='version,ancestors,descendants.page')
+        if not page:
+            return False
+        self._cache_page_tree_fields(page_id, page)
+        return page.get('version', {}).get('number') == version
+
+    def _index_page(self, page):
+        """Add a fetched page with a storage body to the related-pages index and the link graph."""
+        storage = page.get('body', {}).get('storage', {}).get('value')
+        if not page.get('id') or storage is None:
+            return
+        title = page.get('title')
+        space_key = page.get('space', {}).get('key')
+        url = page.get('_links', {}).get('webui')
+        self.related_pages.add_page(page['id'], storage, title=title, space=space_key, url=url)
+        self.link_graph.add_page(page['id'], storage, title=title, space_key=space_key, url=url)
+
     def _get_filtered_pages(self, pages):
         """Filter pages to include only important fields."""
         filtered_pages = []
@@ -234,6 +502,9 @@ class ManageContent:
                 )
 
             logger.info(f"Successfully created page with ID: {page.get('id')}")
+            self._index_page(page)
+            self.cache.invalidate_namespace("tree")
+            self.cache.invalidate_namespace("search")
             return self._remove_null_values(page)
         except Exception as e:
             error_msg = f"Failed to create page '{title}' in space '{space_key}': {str(e)}"
@@ -303,6 +574,11 @@ class ManageContent:
                 logger.info(f"Added version comment: {version_comment}")
 
             logger.info(f"Successfully updated page to version {new_version}")
+            if updated_page:
+                self._index_page(updated_page)
+            self.cache.invalidate("page", str(page_id))
+            self.cache.invalidate_namespace("tree")
+            self.cache.invalidate_namespace("search")
             return self._remove_null_values(updated_page)
         except Exception as e:
             error_msg = f"Failed to update page '{page_id}': {str(e)}"
@@ -0,0 +1,157 @@
+import re
+import html
+import logging
+import threading
+from array import array
+
+logger = logging.getLogger("confluence_mcp")
+
+PAGE_REF_RE = re.compile(r"<ri:page\b([^>]*?)/?>")
+ATTRIBUTE_RE = re.compile(r'(ri:[\w-]+)\s*=\s*"([^"]*)"')
+
+
+def extract_page_links(storage, space_key=None):
+    """Extract (space_key, title, content_id) page references from a storage format body.
+
+    References without a space key point into the linking page's own space.
+    """
+    links = []
+    for match in PAGE_REF_RE.finditer(storage or ""):
+        attributes = {name: html.unescape(value) for name, value in ATTRIBUTE_RE.findall(match.group(1))}
+        title = attributes.get("ri:content-title")
+        content_id = attributes.get("ri:content-id")
+        if title or content_id:
+            links.append((attributes.get("ri:space-key") or space_key, title, content_id))
+    return links
+
+
+class LinkGraph:
+    """Incremental graph of page-to-page links found in storage bodies.
+
+    Storage bodies reference pages by space key and title, so every link
+    target is interned as an integer node keyed by (space, title), or by
+    content id when that is all a link carries. Forward edges are stored per
+    source node as compact unsigned int arrays and backlinks as sets of source
+    nodes, so both directions are answered with dictionary lookups.
+    """
+
+    def __init__(self):
+        self._node_of = {}
+        self._node_keys = []
+        self._page_of_node = {}
+        self._node_of_page = {}
+        self._pages = {}
+        self._forward = {}
+        self._backward = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __contains__(self, page_id):
+        return str(page_id) in self._pages
+
+    def add_page(self, page_id, storage, title=None, space_key=None, url=None):
+        """Add or replace a page and its outgoing links."""
+        page_id = str(page_id)
+        targets = []
+        for link_space, link_title, content_id in extract_page_links(storage, space_key):
+            key = (link_space, link_title) if link_title else ("#", content_id)
+            targets.append(key)
+
+        with self._lock:
+            self._remove_page(page_id)
+            id_node = self._intern(("#", page_id))
+            node = self._intern((space_key, title)) if title else id_node
+
+            self._pages[page_id] = {"id": page_id, "title": title, "space": space_key, "url": url}
+            self._page_of_node[node] = page_id
+            self._page_of_node[id_node] = page_id
+            self._node_of_page[page_id] = node
+
+            forward = array("I", sorted({self._intern(key) for key in targets} - {node, id_node}))
+            self._forward[node] = forward
+            for target in forward:
+                self._backward.setdefault(target, set()).add(node)
+
+    def remove_page(self, page_id):
+        """Remove a page and its outgoing links from the graph."""
+        with self._lock:
+            self._remove_page(str(page_id))
+
+    def outgoing_links(self, page_id):
+        """Return the pages a page links to, resolved to page ids where the target is indexed."""
+        page_id = str(page_id)
+        with self._lock:
+            node = self._node_of_page.get(page_id)
+            if node is None:
+                raise KeyError(page_id)
+            return [self._describe(target) for target in self._forward.get(node, ())]
+
+    def backlinks(self, page_id):
+        """Return the indexed pages that link to a page by title or by content id."""
+        page_id = str(page_id)
+        with self._lock:
+            node = self._node_of_page.get(page_id)
+            if node is None:
+                raise KeyError(page_id)
+            sources = set(self._backward.get(node, ()))
+            sources |= self._backward.get(self._node_of.get(("#", page_id)), set())
+            pages = [self._pages[self._page_of_node[source]] for source in sources
+                     if source in self._page_of_node]
+        return sorted(pages, key=lambda page: (page["space"] or "", page["title"] or ""))
+
+    def orphans(self, space_key=None):
+        """Return indexed pages that no other indexed page links to."""
+        with self._lock:
+            orphans = []
+            for page_id, page in self._pages.items():
+                if space_key and page["space"] != space_key:
+                    continue
+                node = self._node_of_page[page_id]
+                if not self._backward.get(node) and not self._backward.get(self._node_of.get(("#", page_id))):
+                    orphans.append(page)
+        return sorted(orphans, key=lambda page: (page["space"] or "", page["title"] or ""))
+
+    def stats(self):
+        """Return the size of the graph."""
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "nodes": len(self._node_keys),
+                "links": sum(len(targets) for targets in self._forward.values()),
+            }
+
+    def _remove_page(self, page_id):
+        """Drop a page's node mapping and forward edges. Caller must hold the lock."""
+        node = self._node_of_page.pop(page_id, None)
+        if node is None:
+            return
+        self._pages.pop(page_id, None)
+        self._page_of_node.pop(node, None)
+        self._page_of_node.pop(self._node_of.get(("#", page_id)), None)
+        for target in self._forward.pop(node, ()):
+            sources = self._backward.get(target)
+            if sources is not None:
+                sources.discard(node)
+                if not sources:
+                    del self._backward[target]
+
+    def _intern(self, key):
+        """Return the integer node for a (space, title) or ("#", content id) key. Caller must hold the lock."""
+        node = self._node_of.get(key)
+        if node is None:
+            node = len(self._node_keys)
+            self._node_of[key] = node
+            self._node_keys.append(key)
+        return node
+
+    def _describe(self, node):
+        """Describe a link target, using the indexed page when it is known. Caller must hold the lock."""
+        page_id = self._page_of_node.get(node)
+        if page_id is not None:
+            return dict(self._pages[page_id], indexed=True)
+        space_key, title = self._node_keys[node]
+        if space_key == "#":
+            return {"id": title, "title": None, "space": None, "indexed": False}
+        return {"id": None, "title": title, "space": space_key, "indexed": False}
@@ -0,0 +1,138 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from .tracing import tracer
+
+logger = logging.getLogger("confluence_mcp")
+
+# Prefetch settings. Prefetching is off unless explicitly enabled.
+PREFETCH_ENABLED = os.environ.get("CONFLUENCE_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+PREFETCH_WORKERS = int(os.environ.get("CONFLUENCE_PREFETCH_WORKERS", "2"))
+PREFETCH_MAX_REQUESTS_PER_MINUTE = int(os.environ.get("CONFLUENCE_PREFETCH_MAX_REQUESTS_PER_MINUTE", "120"))
+PREFETCH_QUEUE_SIZE = int(os.environ.get("CONFLUENCE_PREFETCH_QUEUE_SIZE", "100"))
+PREFETCH_SEARCH_HITS = int(os.environ.get("CONFLUENCE_PREFETCH_SEARCH_HITS", "3"))
+
+
+class PrefetchBudgetExceeded(Exception):
+    """Raised to stop a prefetch task when the request budget is used up."""
+    pass
+
+
+class Prefetcher:
+    """Background prefetcher that warms the cache with likely follow-up fetches.
+
+    Tasks run on a small pool of daemon threads and are best effort: a task is
+    skipped when its result is already cached or it is already pending, dropped
+    when the queue is full, and stopped when the per-minute request budget is
+    used up, so prefetching never queues work ahead of tool calls. The budget is
+    charged once per upstream request a task makes, through charge().
+    """
+
+    def __init__(self, cache, workers=PREFETCH_WORKERS,
+                 max_requests_per_minute=PREFETCH_MAX_REQUESTS_PER_MINUTE, queue_size=PREFETCH_QUEUE_SIZE):
+        self.cache = cache
+        self.max_requests_per_minute = max_requests_per_minute
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._tokens = float(max_requests_per_minute)
+        self._refilled_at = time.monotonic()
+        self._stats = {"scheduled": 0, "completed": 0, "failed": 0, "requests": 0,
+                       "dropped_queue_full": 0, "dropped_budget": 0}
+
+        for index in range(workers):
+            threading.Thread(target=self._work, name=f"prefetch-{index}", daemon=True).start()
+        logger.info(f"Prefetching enabled with {workers} workers and "
+                    f"{max_requests_per_minute} requests per minute")
+
+    def submit(self, key, func, *args):
+        """Queue a prefetch task unless its result is cached, it is a duplicate or the queue is full.
+
+        The key is the (namespace, key) cache entry the task fills. Calls made
+        from inside a prefetch are ignored so prefetches never cascade.
+        """
+        if self.cache.is_prefetching or self.cache.contains(*key):
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            try:
+                self._queue.put_nowait((key, func, args))
+            except queue.Full:
+                self._stats["dropped_queue_full"] += 1
+                return
+            self._pending.add(key)
+            self._stats["scheduled"] += 1
+
+    def charge(self):
+        """Take a budget token for an upstream request made on the current thread.
+
+        Requests made outside prefetch tasks are free. Raises
+        PrefetchBudgetExceeded to stop the task when the budget is used up.
+        """
+        if not self.cache.is_prefetching:
+            return
+        if not self._take_token():
+            self._local.over_budget = True
+            raise PrefetchBudgetExceeded("Prefetch request budget used up")
+
+    def stats(self):
+        """Return task counters and the current queue depth."""
+        with self._lock:
+            return dict(self._stats, enabled=True, queued=self._queue.qsize(),
+                        max_requests_per_minute=self.max_requests_per_minute)
+
+    def _refill(self):
+        """Top up the per-minute budget for the time since the last refill. Caller must hold the lock."""
+        now = time.monotonic()
+        rate = self.max_requests_per_minute / 60.0
+        self._tokens = min(self.max_requests_per_minute, self._tokens + (now - self._refilled_at) * rate)
+        self._refilled_at = now
+
+    def _has_token(self):
+        """Check for a request left in the per-minute budget without consuming it."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                self._stats["dropped_budget"] += 1
+                return False
+            return True
+
+    def _take_token(self):
+        """Consume one request from the per-minute budget if any is left."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                self._stats["dropped_budget"] += 1
+                return False
+            self._tokens -= 1
+            self._stats["requests"] += 1
+            return True
+
+    def _work(self):
+        """Worker loop that runs queued prefetch tasks."""
+        while True:
+            key, func, args = self._queue.get()
+            self._local.over_budget = False
+            try:
+                # Skip tasks up front when the budget is empty rather than stopping them mid-way
+                if self._has_token():
+                    with self.cache.prefetching(), tracer.background():
+                        func(*args)
+                    with self._lock:
+                        self._stats["completed"] += 1
+            except Exception as e:
+                # Tool methods wrap errors, so the flag tells a budget stop from a failure
+                if self._local.over_budget:
+                    logger.debug(f"Prefetch {key} stopped: request budget used up")
+                else:
+                    logger.debug(f"Prefetch {key} failed: {str(e)}")
+                    with self._lock:
+                        self._stats["failed"] += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
@@ -0,0 +1,276 @@
+import re
+import html
+import zlib
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger("confluence_mcp")
+
+# Number of hashed feature columns; must be a power of two
+DEFAULT_N_FEATURES = 2 ** 20
+
+# Upper bound on memoized token -> feature lookups before the memo is reset
+FEATURE_CACHE_MAX_ENTRIES = 1_000_000
+
+# Number of query rows scored against the index at once
+QUERY_BATCH_SIZE = 32
+
+# Document-frequency changes since the last full build, as a fraction of the
+# built matrix's non-zeros, above which the whole matrix is rebuilt
+DF_DRIFT_REBUILD_RATIO = 0.05
+
+# Changed pages scored from the delta matrix before the whole matrix is rebuilt
+DELTA_MAX_ROWS = 2000
+
+CDATA_RE = re.compile(r"<!\[CDATA\[(.*?)\]\]>", re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+
+STOP_WORDS = frozenset("""
+    an and are as at be but by for from has have in is it its of on or that the this to was
+    were will with not no can you your we our they their which what when where who how all
+""".split())
+
+
+def storage_to_text(storage):
+    """Convert Confluence storage format markup to plain text."""
+    text = CDATA_RE.sub(r" \1 ", storage or "")
+    text = TAG_RE.sub(" ", text)
+    return html.unescape(text)
+
+
+class RelatedPagesIndex:
+    """CPU-only similarity index over page text using hashed TF-IDF vectors.
+
+    Each page is stored as a sparse row of hashed term counts. Document
+    frequencies are maintained incrementally as pages are added, updated or
+    removed. Pages changed since the last full build are weighted with the IDF
+    of that build and scored from a small delta matrix that overrides their
+    rows in the base matrix. The base matrix is rebuilt, in one vectorized
+    pass, only once document frequencies have drifted past
+    DF_DRIFT_REBUILD_RATIO or more than DELTA_MAX_ROWS pages have changed.
+    """
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self._feature_mask = n_features - 1
+        self._feature_cache = {}
+        self._row_of = {}
+        self._page_ids = []
+        self._meta = []
+        self._indices = []
+        self._counts = []
+        self._df = np.zeros(n_features, dtype=np.int32)
+        self._matrix = None
+        self._idf = None
+        self._base_nnz = 0
+        self._df_drift = 0
+        self._delta_rows = {}
+        self._delta_matrix = None
+        self._delta_order = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, page_id):
+        return str(page_id) in self._row_of
+
+    def add_page(self, page_id, storage, title=None, space=None, url=None):
+        """Add or replace a page from its storage format body."""
+        self.add_text(page_id, storage_to_text(storage), title=title, space=space, url=url)
+
+    def add_text(self, page_id, text, title=None, space=None, url=None):
+        """Add or replace a page from plain text."""
+        page_id = str(page_id)
+        # Index the title alongside the body so short pages still have features
+        indices, counts = self._vectorize(f"{title or ''} {text}")
+        meta = {"id": page_id, "title": title, "space": space, "url": url}
+
+        with self._lock:
+            row = self._row_of.get(page_id)
+            if row is None:
+                row = len(self._page_ids)
+                self._row_of[page_id] = row
+                self._page_ids.append(page_id)
+                self._meta.append(meta)
+                self._indices.append(indices)
+                self._counts.append(counts)
+            else:
+                self._df[self._indices[row]] -= 1
+                self._df_drift += len(self._indices[row])
+                self._meta[row] = meta
+                self._indices[row] = indices
+                self._counts[row] = counts
+            self._df[indices] += 1
+            self._df_drift += len(indices)
+            self._mark_changed(row)
+
+    def remove_page(self, page_id):
+        """Remove a page from the index if present."""
+        page_id = str(page_id)
+        with self._lock:
+            row = self._row_of.pop(page_id, None)
+            if row is None:
+                return
+            self._df[self._indices[row]] -= 1
+            self._df_drift += len(self._indices[row])
+            self._page_ids[row] = None
+            self._meta[row] = None
+            self._indices[row] = np.empty(0, dtype=np.int32)
+            self._counts[row] = np.empty(0, dtype=np.float32)
+            self._mark_changed(row)
+
+    def find_related(self, page_id=None, text=None, k=10):
+        """Return the k pages most similar to an indexed page or to free text."""
+        if page_id is not None:
+            page_id = str(page_id)
+            with self._lock:
+                row = self._row_of.get(page_id)
+                if row is None:
+                    raise KeyError(page_id)
+                query = (self._indices[row], self._counts[row])
+            return self._top_k([query], k, exclude_rows=[row])[0]
+
+        if text is None:
+            raise ValueError("Either page_id or text is required")
+        return self._top_k([self._vectorize(text)], k)[0]
+
+    def find_related_batch(self, texts, k=10):
+        """Return the k most similar pages for each of several free-text queries."""
+        return self._top_k([self._vectorize(text) for text in texts], k)
+
+    def _top_k(self, queries, k, exclude_rows=None):
+        """Score query vectors against the index with batched cosine similarity."""
+        with self._lock:
+            matrix, idf = self._ensure_matrix()
+            delta_matrix, delta_order = self._ensure_delta_matrix()
+            meta = list(self._meta)
+
+        results = []
+        if not meta or k <= 0:
+            return [[] for _ in queries]
+
+        dense_query = np.zeros(self.n_features, dtype=np.float32) if delta_matrix is not None else None
+        for start in range(0, len(queries), QUERY_BATCH_SIZE):
+            batch = queries[start:start + QUERY_BATCH_SIZE]
+            query_matrix = self._weighted_matrix(batch, idf)
+            scores = np.zeros((len(batch), len(meta)), dtype=np.float32)
+            scores[:, :matrix.shape[1]] = (query_matrix @ matrix).toarray()
+
+            for offset, row_scores in enumerate(scores):
+                if delta_matrix is not None:
+                    # Rows changed since the last build replace their stale base scores
+                    row = slice(query_matrix.indptr[offset], query_matrix.indptr[offset + 1])
+                    dense_query[query_matrix.indices[row]] = query_matrix.data[row]
+                    row_scores[delta_order] = delta_matrix @ dense_query
+                    dense_query[query_matrix.indices[row]] = 0.0
+                if exclude_rows is not None:
+                    row_scores[exclude_rows[start + offset]] = -1.0
+                count = min(k, len(row_scores))
+                top = np.argpartition(-row_scores, count - 1)[:count]
+                top = top[np.argsort(-row_scores[top], kind="stable")]
+                results.append([
+                    dict(meta[row], score=round(float(row_scores[row]), 4))
+                    for row in top
+                    if row_scores[row] > 0 and meta[row] is not None
+                ])
+        return results
+
+    def _ensure_matrix(self):
+        """Rebuild the normalized TF-IDF matrix when it is missing or out of date. Caller must hold the lock.
+
+        The matrix is kept transposed (features x pages) so query batches can be
+        multiplied against it directly.
+        """
+        drifted = self._df_drift > DF_DRIFT_REBUILD_RATIO * max(self._base_nnz, 1)
+        if self._matrix is None or drifted or len(self._delta_rows) > DELTA_MAX_ROWS:
+            n_docs = len(self._row_of)
+            self._idf = (np.log((1.0 + n_docs) / (1.0 + self._df)) + 1.0).astype(np.float32)
+            rows = list(zip(self._indices, self._counts))
+            self._matrix = self._weighted_matrix(rows, self._idf).T.tocsr()
+            self._base_nnz = self._matrix.nnz
+            self._df_drift = 0
+            self._delta_rows.clear()
+            self._delta_matrix = None
+            self._delta_order = None
+            logger.info(f"Rebuilt related-pages index for {n_docs} pages "
+                        f"({self._matrix.nnz} non-zero features)")
+        return self._matrix, self._idf
+
+    def _ensure_delta_matrix(self):
+        """Stack the rows changed since the last full build into a pages x features matrix.
+
+        Changed rows are weighted once, when they change, so restacking them is
+        a concatenation proportional to the changed rows. Caller must hold the lock.
+        """
+        if self._delta_rows and self._delta_matrix is None:
+            self._delta_order = np.fromiter(sorted(self._delta_rows), dtype=np.int64, count=len(self._delta_rows))
+            rows = [self._delta_rows[row] for row in self._delta_order]
+            lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            indices = np.concatenate([indices for indices, _ in rows])
+            data = np.concatenate([data for _, data in rows])
+            self._delta_matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), self.n_features))
+        return self._delta_matrix, self._delta_order
+
+    def _mark_changed(self, row):
+        """Route a changed row through the delta matrix until the next full build. Caller must hold the lock."""
+        if self._matrix is not None:
+            weighted = self._weighted_matrix([(self._indices[row], self._counts[row])], self._idf)
+            self._delta_rows[row] = (weighted.indices, weighted.data)
+            self._delta_matrix = None
+
+    def _weighted_matrix(self, rows, idf):
+        """Build an L2-normalized sparse TF-IDF matrix from (indices, counts) rows."""
+        lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        if indptr[-1]:
+            indices = np.concatenate([indices for indices, _ in rows])
+            counts = np.concatenate([counts for _, counts in rows])
+        else:
+            indices = np.empty(0, dtype=np.int32)
+            counts = np.empty(0, dtype=np.float32)
+
+        data = (1.0 + np.log(counts, dtype=np.float32)) * idf[indices]
+        row_ids = np.repeat(np.arange(len(rows)), lengths)
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(rows)))
+        norms[norms == 0] = 1.0
+        data = (data / norms[row_ids]).astype(np.float32)
+
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), self.n_features))
+
+    def _vectorize(self, text):
+        """Hash the tokens of a text into sorted unique feature indices and counts."""
+        tokens = Counter(token for token in TOKEN_RE.findall((text or "").lower())
+                         if token not in STOP_WORDS)
+        if not tokens:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        features = np.fromiter((self._feature(token) for token in tokens),
+                               dtype=np.int32, count=len(tokens))
+        counts = np.fromiter(tokens.values(), dtype=np.float32, count=len(tokens))
+
+        # Merge tokens whose hashes collide into a single feature
+        indices, inverse = np.unique(features, return_inverse=True)
+        merged = np.bincount(inverse, weights=counts, minlength=len(indices)).astype(np.float32)
+        return indices.astype(np.int32), merged
+
+    def _feature(self, token):
+        """Map a token to its hashed feature index."""
+        feature = self._feature_cache.get(token)
+        if feature is None:
+            if len(self._feature_cache) >= FEATURE_CACHE_MAX_ENTRIES:
+                self._feature_cache.clear()
+            feature = zlib.crc32(token.encode("utf-8")) & self._feature_mask
+            self._feature_cache[token] = feature
+        return feature
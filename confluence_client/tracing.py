@@ -0,0 +1,383 @@
+import os
+import sys
+import time
+import inspect
+import logging
+import functools
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("confluence_mcp")
+
+# Tracing settings. Tracing is off unless explicitly enabled, here or at runtime.
+TRACING_ENABLED = os.environ.get("CONFLUENCE_TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+SLOW_CALL_THRESHOLD_MS = float(os.environ.get("CONFLUENCE_SLOW_CALL_MS", "1000"))
+SLOW_CALL_LOG_SIZE = int(os.environ.get("CONFLUENCE_SLOW_CALL_LOG_SIZE", "50"))
+
+# Spans kept per trace for the slow-call log; phase totals always cover every span
+MAX_SPANS_PER_TRACE = 200
+
+# Innermost frames, innermost first, of threads parked with nothing to do: idle
+# executor workers, queue consumers, Event.wait loops and the event loop's select
+IDLE_STACK_TAILS = (
+    ("thread.py:_worker",),
+    ("threading.py:wait", "queue.py:get"),
+    ("threading.py:wait", "threading.py:wait"),
+    ("selectors.py:select",),
+)
+
+
+def span_phase(name):
+    """Classify a span name into the phase it is reported under."""
+    if name.startswith("rest."):
+        return "upstream"
+    if name == "serialize":
+        return "serialize"
+    if "._" in name:
+        return "postprocess"
+    return None
+
+
+class _NullSpan:
+    """Span used while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Trace:
+    """Spans recorded for one top-level call.
+
+    Worker threads record into a fork of the caller's trace: the fork shares
+    the spans, phase totals and lock but keeps its own stack of open spans.
+    """
+
+    __slots__ = ("name", "stack", "spans", "phases", "lock", "background")
+
+    def __init__(self, name, background=False):
+        self.name = name
+        self.stack = []
+        self.spans = []
+        self.phases = {}
+        self.lock = threading.Lock()
+        self.background = background
+
+    def fork(self):
+        """Return a view of this trace for use on another thread."""
+        forked = _Trace(self.name, self.background)
+        forked.stack = list(self.stack)
+        forked.spans = self.spans
+        forked.phases = self.phases
+        forked.lock = self.lock
+        return forked
+
+
+class _Span:
+    """A timed section of a trace."""
+
+    __slots__ = ("tracer", "name", "phase", "trace", "root", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.phase = span_phase(name)
+
+    def __enter__(self):
+        trace = getattr(self.tracer._local, "trace", None)
+        self.root = trace is None
+        if self.root:
+            trace = _Trace(self.name, background=getattr(self.tracer._local, "background", False))
+            self.tracer._local.trace = trace
+        self.trace = trace
+        trace.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        trace = self.trace
+        trace.stack.pop()
+
+        with trace.lock:
+            # Nested spans of the same phase are already counted by their parent
+            if self.phase and not any(parent.phase == self.phase for parent in trace.stack):
+                trace.phases[self.phase] = trace.phases.get(self.phase, 0.0) + duration_ms
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append((self.name, len(trace.stack), duration_ms))
+
+        if self.root:
+            self.tracer._local.trace = None
+            self.tracer._finish(trace, duration_ms)
+        return False
+
+
+class Tracer:
+    """Opt-in per-phase tracing for tool handlers and ManageContent calls.
+
+    Spans are grouped into upstream REST calls, post-processing and
+    serialization. Top-level calls slower than the threshold are logged and
+    kept in a bounded slow-call log. Work handed to other threads through
+    propagate() is recorded in the caller's trace, with time on concurrent
+    threads summed per phase. Work run under background() is traced but never
+    counted or logged as a call. While disabled, span() returns a shared no-op
+    context manager and traced wrappers call straight through.
+    """
+
+    def __init__(self, enabled=TRACING_ENABLED, slow_threshold_ms=SLOW_CALL_THRESHOLD_MS,
+                 slow_log_size=SLOW_CALL_LOG_SIZE):
+        self.enabled = enabled
+        self.slow_threshold_ms = slow_threshold_ms
+        self._local = threading.local()
+        self._slow_calls = deque(maxlen=slow_log_size)
+        self._traced_calls = 0
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, slow_threshold_ms=None):
+        """Change tracing settings at runtime and return the current status."""
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_threshold_ms is not None:
+            self.slow_threshold_ms = slow_threshold_ms
+        logger.info(f"Tracing {'enabled' if self.enabled else 'disabled'} "
+                    f"(slow call threshold {self.slow_threshold_ms} ms)")
+        return self.status()
+
+    def status(self):
+        """Return the current tracing settings and counters."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "slow_threshold_ms": self.slow_threshold_ms,
+                "traced_calls": self._traced_calls,
+                "slow_calls": len(self._slow_calls),
+            }
+
+    def span(self, name):
+        """Return a context manager timing a named section of the current trace."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def propagate(self, func):
+        """Wrap a function so spans it records on a worker thread join the calling thread's trace."""
+        trace = getattr(self._local, "trace", None)
+        if not self.enabled or trace is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, "trace", None)
+            self._local.trace = trace.fork()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.trace = previous
+        return wrapper
+
+    @contextmanager
+    def background(self):
+        """Keep traces started on this thread out of the call counters and the slow-call log."""
+        self._local.background = True
+        try:
+            yield
+        finally:
+            self._local.background = False
+
+    def current_span_name(self):
+        """Return the name of the innermost open span on this thread, if any."""
+        trace = getattr(self._local, "trace", None)
+        return trace.stack[-1].name if trace is not None and trace.stack else None
+
+    def slow_calls(self, limit=20):
+        """Return the most recent slow calls, newest first."""
+        with self._lock:
+            return list(self._slow_calls)[::-1][:limit]
+
+    def _finish(self, trace, duration_ms):
+        """Record a finished top-level trace and log it if it was slow."""
+        if trace.background:
+            return
+        with self._lock:
+            self._traced_calls += 1
+        if duration_ms < self.slow_threshold_ms:
+            return
+
+        phases = {phase: round(ms, 2) for phase, ms in trace.phases.items()}
+        phases["other"] = round(max(duration_ms - sum(trace.phases.values()), 0.0), 2)
+        record = {
+            "name": trace.name,
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+            "duration_ms": round(duration_ms, 2),
+            "phases": phases,
+            "spans": [{"name": name, "depth": depth, "duration_ms": round(ms, 2)}
+                      for name, depth, ms in trace.spans],
+        }
+        with self._lock:
+            self._slow_calls.append(record)
+        breakdown = ", ".join(f"{phase}={ms:.0f}ms" for phase, ms in phases.items())
+        logger.warning(f"Slow call {trace.name} took {duration_ms:.0f} ms ({breakdown})")
+
+
+tracer = Tracer()
+
+
+def traced(name, func):
+    """Wrap a function in a span; recursive calls are folded into the outer span."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled or tracer.current_span_name() == name:
+            return func(*args, **kwargs)
+        with _Span(tracer, name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def trace_methods(*helpers):
+    """Class decorator that traces every public method plus the named private helpers.
+
+    Generator methods are left alone since a span would only time creating the generator.
+    """
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if not inspect.isfunction(value) or inspect.isgeneratorfunction(value):
+                continue
+            if attr.startswith("_") and attr not in helpers:
+                continue
+            setattr(cls, attr, traced(f"{cls.__name__}.{attr}", value))
+        return cls
+    return decorator
+
+
+def read_eagerly(func):
+    """Wrap a function so a generator result is read to a list before the call returns."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        return list(result) if inspect.isgenerator(result) else result
+    return wrapper
+
+
+class TracedClient:
+    """Proxy for the Confluence client that times each upstream call while tracing is enabled.
+
+    Paged calls return generators that make their requests as they are read,
+    so their results are read inside the span to time those requests as upstream.
+    An optional before_call hook runs ahead of every upstream call.
+    """
+
+    def __init__(self, client, before_call=None):
+        self._client = client
+        self._before_call = before_call
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        if self._before_call is not None:
+            attr = self._with_hook(attr)
+        if not tracer.enabled:
+            return attr
+        return traced(f"rest.{name}", read_eagerly(attr))
+
+    def _with_hook(self, func):
+        """Wrap an upstream call so the before_call hook runs first."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._before_call()
+            return func(*args, **kwargs)
+        return wrapper
+
+
+class SamplingProfiler:
+    """Sampling profiler that records collapsed stacks of all threads.
+
+    A background thread snapshots every other thread's stack at a fixed
+    interval while running. Threads idling in a known wait primitive are
+    skipped so the profile shows work rather than parked workers. dump()
+    returns the samples in the collapsed format ("frame;frame;frame count")
+    used by flame graph tools.
+    """
+
+    def __init__(self):
+        self.interval_ms = None
+        self._samples = Counter()
+        self._sample_count = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=10.0):
+        """Start sampling, or change the interval if already running."""
+        self.stop()
+        self.interval_ms = interval_ms
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, args=(self._stop, interval_ms / 1000.0),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started ({interval_ms} ms interval)")
+        return self.status()
+
+    def stop(self):
+        """Stop sampling; collected samples are kept until dumped with reset."""
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+            logger.info("Sampling profiler stopped")
+        self._thread = None
+        return self.status()
+
+    def status(self):
+        """Return whether the profiler is running and how much it has collected."""
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": self.interval_ms,
+                "samples": self._sample_count,
+                "unique_stacks": len(self._samples),
+            }
+
+    def dump(self, reset=False):
+        """Return collected samples as collapsed stacks, most frequent first."""
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self._samples.most_common()]
+            if reset:
+                self._samples.clear()
+                self._sample_count = 0
+        return "\n".join(lines)
+
+    def _sample(self, stop, interval):
+        """Profiler thread loop."""
+        own_id = threading.get_ident()
+        while not stop.wait(interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if any(tuple(stack[:len(tail)]) == tail for tail in IDLE_STACK_TAILS):
+                    continue
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._samples.update(stacks)
+                self._sample_count += 1
+
+
+profiler = SamplingProfiler()
@@ -1,7 +1,8 @@
 import sys
 import logging
+import functools
 from mcp.server.fastmcp import FastMCP
-from confluence_client import ConfluenceClient, ManageContent
+from confluence_client import ConfluenceClient, ManageContent, ResponseBudget, tracer, profiler
 from confluence_client.client import ConfluenceError
 from typing import List, Dict, Optional, Union
 
@@ -29,6 +30,21 @@ except Exception as e:
     logger.error(f"Unexpected error during initialization: {e}")
     sys.exit(1)
 
+# Shared response budget for all tool results
+response_budget = ResponseBudget()
+
+def tool():
+    """Register an MCP tool whose result is traced and kept within the response budget."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(f"tool.{func.__name__}"):
+                result = func(*args, **kwargs)
+                with tracer.span("serialize"):
+                    return response_budget.apply(result)
+        return mcp.tool()(wrapper)
+    return decorator
+
 # Example tool
 @mcp.tool()
 def add(a: int, b: int) -> int:
@@ -38,7 +54,7 @@ def add(a: int, b: int) -> int:
 # Content Management Tools
 
 # Content Creation and Modification Tools
-@mcp.tool()
+@tool()
 def create_page(space_key: str, title: str, body: str, parent_id: Optional[str] = None, representation: str = "storage") -> Dict:
     """
     Create a new page in Confluence.
@@ -53,7 +69,7 @@ def create_page(space_key: str, title: str, body: str, parent_id: Optional[str]
     """
     return manage_content.CreatePage(space_key, title, body, parent_id, representation)
 
-@mcp.tool()
+@tool()
 def update_page(page_id: str, title: str = None, body: str = None, representation: str = "storage", version_comment: str = None) -> Dict:
     """
     Update an existing Confluence page.
@@ -69,7 +85,7 @@ def update_page(page_id: str, title: str = None, body: str = None, representatio
     return manage_content.UpdatePage(page_id, title, body, representation, version_comment)
 
 # Content Query Tools
-@mcp.tool()
+@tool()
 def get_spaces(limit: int = 50) -> str:
     """
     Retrieve all available Confluence spaces.
@@ -80,7 +96,7 @@ def get_spaces(limit: int = 50) -> str:
     """
     return manage_content.GetSpaces(limit)
 
-@mcp.tool()
+@tool()
 def get_space_count() -> int:
     """
     Retrieve the count of all active Confluence spaces.
@@ -89,7 +105,7 @@ def get_space_count() -> int:
     """
     return manage_content.GetSpaceCount()
 
-@mcp.tool()
+@tool()
 def get_space(space_key: str) -> Dict:
     """
     Retrieve details for a specific Confluence space.
@@ -100,7 +116,7 @@ def get_space(space_key: str) -> Dict:
     """
     return manage_content.GetSpace(space_key)
 
-@mcp.tool()
+@tool()
 def get_pages_in_space(space_key: str, limit: int = 20) -> str:
     """
     Retrieve pages from a specific Confluence space.
@@ -112,7 +128,7 @@ def get_pages_in_space(space_key: str, limit: int = 20) -> str:
     """
     return manage_content.GetPagesInSpace(space_key, limit)
 
-@mcp.tool()
+@tool()
 def get_page_count_for_space(space_key: str) -> int:
     """
     Retrieve the count of pages for a specific Confluence space.
@@ -123,7 +139,7 @@ def get_page_count_for_space(space_key: str) -> int:
     """
     return manage_content.GetPageCountForSpace(space_key)
 
-@mcp.tool()
+@tool()
 def get_page(page_id: str) -> Dict:
     """
     Retrieve details of a specific Confluence page.
@@ -134,7 +150,7 @@ def get_page(page_id: str) -> Dict:
     """
     return manage_content.GetPage(page_id)
 
-@mcp.tool()
+@tool()
 def get_page_by_title(space_key: str, title: str) -> Optional[Dict]:
     """
     Retrieve a page by its title in a specific space.
@@ -146,7 +162,7 @@ def get_page_by_title(space_key: str, title: str) -> Optional[Dict]:
     """
     return manage_content.GetPageByTitle(space_key, title)
 
-@mcp.tool()
+@tool()
 def get_child_pages(page_id: str) -> str:
     """
     Retrieve child pages of a specific Confluence page.
@@ -157,7 +173,20 @@ def get_child_pages(page_id: str) -> str:
     """
     return manage_content.GetChildPages(page_id)
 
-@mcp.tool()
+@tool()
+def get_descendants(page_id: str, max_depth: int = 5, max_nodes: int = 1000) -> str:
+    """
+    Retrieve the descendant pages of a Confluence page, walking the tree breadth-first.
+    Args:
+        page_id: The ID of the root Confluence page.
+        max_depth: Maximum number of levels below the root to fetch (default: 5).
+        max_nodes: Maximum number of descendant pages to return (default: 1000).
+    Returns:
+        List of descendant page dictionaries in level order, each with its depth and parent_id.
+    """
+    return manage_content.GetDescendants(page_id, max_depth, max_nodes)
+
+@tool()
 def get_page_ancestors(page_id: str) -> str:
     """
     Retrieve ancestors of a specific Confluence page.
@@ -168,7 +197,7 @@ def get_page_ancestors(page_id: str) -> str:
     """
     return manage_content.GetPageAncestors(page_id)
 
-@mcp.tool()
+@tool()
 def search_content(query: str, content_type: str = "page", space_key: Optional[str] = None, max_results: int = 10) -> str:
     """
     Search for Confluence content matching a query.
@@ -182,7 +211,7 @@ def search_content(query: str, content_type: str = "page", space_key: Optional[s
     """
     return manage_content.SearchContent(query, content_type, space_key, max_results)
 
-@mcp.tool()
+@tool()
 def get_page_labels(page_id: str) -> str:
     """
     Retrieve labels for a specific Confluence page.
@@ -193,7 +222,7 @@ def get_page_labels(page_id: str) -> str:
     """
     return manage_content.GetPageLabels(page_id)
 
-@mcp.tool()
+@tool()
 def get_content_by_label(label: str, space_key: Optional[str] = None, content_type: str = "page", max_results: int = 10) -> str:
     """
     Find Confluence content with a specific label.
@@ -207,7 +236,7 @@ def get_content_by_label(label: str, space_key: Optional[str] = None, content_ty
     """
     return manage_content.GetContentByLabel(label, space_key, content_type, max_results)
 
-@mcp.tool()
+@tool()
 def get_page_attachments(page_id: str) -> str:
     """
     Retrieve attachments for a specific Confluence page.
@@ -218,5 +247,139 @@ def get_page_attachments(page_id: str) -> str:
     """
     return manage_content.GetPageAttachments(page_id)
 
+# Related Pages Tools
+@tool()
+def find_related_pages(page_id: Optional[str] = None, text: Optional[str] = None, k: int = 10) -> str:
+    """
+    Find pages similar to a Confluence page or to a piece of text using the local similarity index.
+    Args:
+        page_id: The ID of the page to find related pages for (fetched and indexed if needed).
+        text: Free text to find related pages for, used when page_id is not given.
+        k: Maximum number of related pages to return (default: 10).
+    Returns:
+        List of related page dictionaries with similarity scores.
+    """
+    return manage_content.FindRelatedPages(page_id, text, k)
+
+@tool()
+def index_space_for_related_pages(space_key: str, max_pages: int = 1000) -> Dict:
+    """
+    Add the pages of a Confluence space to the local similarity index.
+    Args:
+        space_key: The key of the Confluence space.
+        max_pages: Maximum number of pages to index (default: 1000).
+    Returns:
+        Number of pages indexed.
+    """
+    return manage_content.IndexSpaceForRelatedPages(space_key, max_pages)
+
+# Link Graph Tools
+@tool()
+def get_backlinks(page_id: str) -> Dict:
+    """
+    Find the pages that link to a specific Confluence page ("what links here").
+    Args:
+        page_id: The ID of the Confluence page.
+    Returns:
+        Dictionary with the linking pages and the number of pages in the link index.
+    """
+    return manage_content.GetBacklinks(page_id)
+
+@tool()
+def get_outgoing_links(page_id: str) -> str:
+    """
+    Retrieve the pages a specific Confluence page links to.
+    Args:
+        page_id: The ID of the Confluence page.
+    Returns:
+        List of linked page dictionaries.
+    """
+    return manage_content.GetOutgoingLinks(page_id)
+
+@tool()
+def get_orphan_pages(space_key: Optional[str] = None) -> str:
+    """
+    Find indexed pages that no other indexed page links to.
+    Args:
+        space_key: Optional space key to restrict the result to.
+    Returns:
+        List of orphaned page dictionaries.
+    """
+    return manage_content.GetOrphanPages(space_key)
+
+# Cache Tools
+@mcp.tool()
+def get_cache_stats() -> Dict:
+    """
+    Retrieve cache hit rates and background prefetch statistics.
+    Returns:
+        Dictionary with per-namespace cache hits and misses, prefetch hit rate and prefetch task counters.
+    """
+    return {
+        "cache": manage_content.cache.stats(),
+        "prefetch": manage_content.prefetcher.stats() if manage_content.prefetcher else {"enabled": False},
+    }
+
+# Response Budget Tools
+@mcp.tool()
+def get_continuation(handle: str) -> Dict:
+    """
+    Fetch the next chunk of a result that was truncated to fit the response budget.
+    Args:
+        handle: The continuation handle returned with the truncated result.
+    Returns:
+        The next chunk, with a new continuation handle if more chunks remain.
+    """
+    return response_budget.get_continuation(handle)
+
+# Admin Tools
+@mcp.tool()
+def configure_tracing(enabled: bool, slow_threshold_ms: Optional[float] = None) -> Dict:
+    """
+    Turn per-phase tracing of tool calls on or off.
+    Args:
+        enabled: Whether tracing is enabled.
+        slow_threshold_ms: Optional duration above which a call is logged as slow.
+    Returns:
+        Current tracing settings and counters.
+    """
+    return tracer.configure(enabled, slow_threshold_ms)
+
+@tool()
+def get_slow_calls(limit: int = 20) -> str:
+    """
+    Retrieve the most recent slow tool calls recorded while tracing was enabled.
+    Args:
+        limit: Maximum number of calls to return (default: 20).
+    Returns:
+        List of slow calls, newest first, with time spent per phase and per span.
+    """
+    return tracer.slow_calls(limit)
+
+@mcp.tool()
+def set_profiling(enabled: bool, interval_ms: float = 10.0) -> Dict:
+    """
+    Start or stop the sampling profiler.
+    Args:
+        enabled: Whether the profiler should be running.
+        interval_ms: Sampling interval in milliseconds (default: 10).
+    Returns:
+        Current profiler status.
+    """
+    if enabled:
+        return profiler.start(interval_ms)
+    return profiler.stop()
+
+@tool()
+def dump_profile(reset: bool = False) -> str:
+    """
+    Dump the samples collected by the sampling profiler as collapsed stacks.
+    Args:
+        reset: Whether to clear the collected samples after dumping (default: False).
+    Returns:
+        Collapsed stacks, one "frame;frame;frame count" line per unique stack.
+    """
+    return profiler.dump(reset)
+
 if __name__ == "__main__":
     mcp.run()